@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+import asyncio
+import gzip
+import hashlib
+import logging
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Optional compressors; encodings whose package is missing are simply not offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=settings.compression_gzip_level)
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=settings.compression_brotli_quality)
+
+def _zstd(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=settings.compression_zstd_level).compress(body)
+
+COMPRESSORS = {"gzip": _gzip}
+if brotli is not None:
+    COMPRESSORS["br"] = _brotli
+if zstandard is not None:
+    COMPRESSORS["zstd"] = _zstd
+
+# Listed explicitly so streaming types such as text/event-stream are never buffered
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+    "text/xml",
+}
+
+
+def is_compressible(content_type: str) -> bool:
+    """Return True if a response with this Content-Type should be compressed."""
+    return content_type.split(";", 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110 13.1.2)."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == opaque:
+            return True
+    return False
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Return the q-value of every coding listed in an Accept-Encoding header."""
+    qualities = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding] = q
+    return qualities
+
+def choose_encoding(header: str, encodings) -> str:
+    """Pick the first of the server's preferred encodings that the client accepts, or None."""
+    qualities = parse_accept_encoding(header)
+    for encoding in encodings:
+        if qualities.get(encoding, qualities.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by (ETag, encoding), bounded by total size."""
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, etag: str, encoding: str):
+        body = self._entries.get((etag, encoding))
+        if body is not None:
+            self._entries.move_to_end((etag, encoding))
+        return body
+
+    def put(self, etag: str, encoding: str, body: bytes):
+        if len(body) > self.max_entry_bytes or len(body) > self.max_bytes:
+            return
+        previous = self._entries.pop((etag, encoding), None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._entries[(etag, encoding)] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class CompressionMiddleware(BaseHTTPMiddleware):
+    """Compress responses according to Accept-Encoding.
+
+    Successful GET responses also get a weak ETag computed from the
+    uncompressed body. It answers If-None-Match with 304 and keys a cache of
+    compressed bodies, so a page that has not changed is compressed once.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.encodings = [
+            encoding.strip() for encoding in settings.compression_encodings.split(",")
+            if encoding.strip() in COMPRESSORS
+        ]
+        self.cache = CompressedBodyCache(settings.compression_cache_max_bytes, settings.compression_cache_max_entry_bytes)
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+
+        content_type = response.headers.get("content-type", "")
+        if "content-encoding" in response.headers or not is_compressible(content_type):
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = [
+            (name, value) for name, value in response.raw_headers
+            if name not in (b"content-length", b"etag")
+        ]
+
+        etag = None
+        if request.method == "GET" and response.status_code == 200:
+            etag = 'W/"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            headers.append((b"etag", etag.encode("latin-1")))
+            if etag_matches(request.headers.get("if-none-match", ""), etag):
+                return self._build_response(b"", 304, headers + [(b"vary", b"Accept-Encoding")], with_length=False)
+
+        if len(body) < settings.compression_min_size:
+            return self._build_response(body, response.status_code, headers)
+
+        headers.append((b"vary", b"Accept-Encoding"))
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            return self._build_response(body, response.status_code, headers)
+
+        compressed = self.cache.get(etag, encoding) if etag else None
+        if compressed is None:
+            if len(body) >= settings.compression_thread_min_size:
+                # Large bodies are compressed in a worker thread so other requests are not blocked
+                compressed = await asyncio.to_thread(COMPRESSORS[encoding], body)
+            else:
+                compressed = COMPRESSORS[encoding](body)
+            if etag:
+                self.cache.put(etag, encoding, compressed)
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+        return self._build_response(compressed, response.status_code, headers)
+
+    @staticmethod
+    def _build_response(body: bytes, status_code: int, headers, with_length: bool = True):
+        new_response = Response(content=body, status_code=status_code)
+        new_response.raw_headers = list(headers)
+        if with_length:
+            new_response.raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        return new_response
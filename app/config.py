@@ -11,6 +11,22 @@ class Settings(BaseSettings):
     secret_key: str = "your_secret_key_here"  # Default secret key for JWT token encoding (should be overridden in production)
     algorithm: str = "HS256"  # Default algorithm for JWT token encoding
     access_token_expire_seconds: int = 30 * 60  # Default token expiration time (30 minutes)
+    refresh_token_expire_seconds: int = 30 * 24 * 60 * 60  # Default refresh token expiration time (30 days)
+    refresh_token_reuse_grace_seconds: int = 10  # A rotated refresh token reused within this window is rejected without revoking the user's other tokens
+    post_stats_reconcile_seconds: int = 60 * 60  # Interval of the post statistics reconciliation job (1 hour, 0 runs it only at startup)
+    idempotency_store: str = "memory"  # Where Idempotency-Key responses are kept: "memory" (per process) or "database" (shared by workers)
+    idempotency_max_keys: int = 10000  # Maximum number of keys kept by the in-memory store
+    idempotency_ttl_seconds: int = 24 * 60 * 60  # How long a stored response can be replayed (24 hours)
+    idempotency_wait_seconds: int = 30  # How long a duplicate request waits for the in-flight original
+    idempotency_lease_seconds: int = 10 * 60  # Age after which an unfinished database claim is assumed to belong to a crashed worker
+    compression_encodings: str = "zstd,br,gzip"  # Response encodings in order of preference (br needs brotli, zstd needs zstandard)
+    compression_min_size: int = 1024  # Responses smaller than this many bytes are sent uncompressed
+    compression_gzip_level: int = 6  # gzip compression level (1-9)
+    compression_brotli_quality: int = 4  # brotli quality (0-11)
+    compression_zstd_level: int = 3  # zstd compression level (1-22)
+    compression_thread_min_size: int = 64 * 1024  # Bodies at least this large are compressed in a worker thread
+    compression_cache_max_bytes: int = 32 * 1024 * 1024  # Total size of compressed GET bodies cached by ETag (0 disables the cache)
+    compression_cache_max_entry_bytes: int = 1024 * 1024  # Compressed bodies larger than this are not cached
     
     model_config = SettingsConfigDict(
         env_file=".env"
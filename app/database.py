@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Text, TIMESTAMP
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, Text, TIMESTAMP, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import datetime
@@ -36,8 +36,42 @@ class User(Base):
     password = Column(String(255), nullable=False)
     created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow)    
 
-# Create tables if they don't exist
-Base.metadata.create_all(bind=engine)
+#Refresh token model (only the keyed hash of the token is stored, never the token itself)
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False)
+    revoked = Column(Boolean, default=False, nullable=False)
+    rotated_at = Column(TIMESTAMP, nullable=True)  # Set when the token was exchanged by /auth/refresh
+    created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow)
+
+#Post statistics model (single row, kept in sync with the posts table on every write)
+class PostStats(Base):
+    __tablename__ = "post_stats"
+
+    id = Column(Integer, primary_key=True)
+    total_posts = Column(Integer, nullable=False, default=0)
+    published_posts = Column(Integer, nullable=False, default=0)
+    rated_posts = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+#Idempotency key model (used when idempotency_store is "database")
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    response_body = Column(Text, nullable=True)  # NULL while the original request is still in flight
+    created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow, nullable=False)
+    expires_at = Column(TIMESTAMP, index=True, nullable=False)
+
+# Create tables if they don't exist (called at application startup)
+def create_tables():
+    Base.metadata.create_all(bind=engine)
 
 # Dependency to get DB session
 def get_db():
@@ -0,0 +1,280 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.exc import IntegrityError
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from . import database
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _mismatch_exception():
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="Idempotency-Key was already used with a different request body"
+    )
+
+def _in_progress_exception():
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is still being processed"
+    )
+
+
+class _Entry:
+    def __init__(self, key: str, fingerprint: str, ttl_seconds: int):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.expires_at = time.monotonic() + ttl_seconds
+        self.body = None
+        self.done = asyncio.Event()
+
+
+class MemoryIdempotencyStore:
+    """Bounded LRU of responses kept in this process."""
+
+    def __init__(self, max_keys: int, ttl_seconds: int, wait_seconds: int):
+        self.max_keys = max_keys
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self._entries = OrderedDict()
+
+    async def begin(self, key: str, fingerprint: str):
+        """Return `(claim, None)` if the key was claimed, or `(None, body)` to replay.
+
+        A duplicate of an in-flight request waits until the original finishes.
+        """
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None and entry.done.is_set() and entry.expires_at < time.monotonic():
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                entry = _Entry(key, fingerprint, self.ttl_seconds)
+                self._entries[key] = entry
+                self._evict()
+                return entry, None
+
+            self._entries.move_to_end(key)
+            if entry.fingerprint != fingerprint:
+                raise _mismatch_exception()
+            if entry.done.is_set():
+                return None, entry.body
+            try:
+                await asyncio.wait_for(entry.done.wait(), timeout=self.wait_seconds)
+            except asyncio.TimeoutError:
+                raise _in_progress_exception()
+
+    async def complete(self, claim: _Entry, body):
+        claim.body = body
+        claim.done.set()
+
+    async def release(self, claim: _Entry):
+        if self._entries.get(claim.key) is claim:
+            del self._entries[claim.key]
+        claim.done.set()
+
+    def _evict(self):
+        # Drop the least recently used completed entries; in-flight ones are never evicted
+        excess = len(self._entries) - self.max_keys
+        if excess <= 0:
+            return
+        evicted = []
+        for key, entry in self._entries.items():
+            if entry.done.is_set():
+                evicted.append(key)
+                if len(evicted) == excess:
+                    break
+        for key in evicted:
+            del self._entries[key]
+
+
+# Returned by DatabaseIdempotencyStore._try_claim while the original request is still running
+_PENDING = object()
+
+
+class _DatabaseClaim:
+    """Identifies one claim row; a row re-inserted by a takeover has another created_at."""
+
+    def __init__(self, key: str, created_at: datetime):
+        self.key = key
+        self.created_at = created_at
+
+
+class DatabaseIdempotencyStore:
+    """Responses kept in the idempotency_keys table, shared by all workers.
+
+    The blocking database calls run in a worker thread so they do not stall
+    the event loop.
+    """
+
+    poll_interval = 0.1
+    max_poll_interval = 1.0
+
+    def __init__(self, ttl_seconds: int, wait_seconds: int, lease_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self.lease_seconds = lease_seconds
+
+    async def begin(self, key: str, fingerprint: str):
+        """Return `(claim, None)` if the key was claimed, or `(None, body)` to replay.
+
+        A duplicate of an in-flight request polls, with backoff, until the
+        original finishes. One session is used for all polls.
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        interval = self.poll_interval
+        db = database.SessionLocal()
+        try:
+            while True:
+                result = await asyncio.to_thread(self._try_claim, db, key, fingerprint)
+                if result is not _PENDING:
+                    return result
+                if time.monotonic() > deadline:
+                    raise _in_progress_exception()
+                await asyncio.sleep(interval)
+                interval = min(interval * 2, self.max_poll_interval)
+        finally:
+            db.close()
+
+    def _try_claim(self, db, key: str, fingerprint: str):
+        """Return the `begin` result, or _PENDING while the original is running.
+
+        An expired row, or an in-flight row older than the lease (its worker
+        is assumed to have crashed), is taken over. The delete only matches
+        the exact row that was read, so two workers cannot both take it over.
+        """
+        try:
+            now = datetime.utcnow()
+            row = db.query(database.IdempotencyKey).filter(database.IdempotencyKey.key == key).first()
+            if row is not None and (
+                row.expires_at < now
+                or (row.response_body is None and row.created_at < now - timedelta(seconds=self.lease_seconds))
+            ):
+                deleted = db.query(database.IdempotencyKey).filter(
+                    database.IdempotencyKey.key == key,
+                    database.IdempotencyKey.created_at == row.created_at,
+                ).delete(synchronize_session=False)
+                db.commit()
+                if not deleted:
+                    # Another worker took it over first; read its row on the next pass
+                    return _PENDING
+                row = None
+
+            if row is None:
+                db.query(database.IdempotencyKey).filter(
+                    database.IdempotencyKey.expires_at < now
+                ).delete(synchronize_session=False)
+                db.add(database.IdempotencyKey(
+                    key=key,
+                    fingerprint=fingerprint,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl_seconds),
+                ))
+                try:
+                    db.commit()
+                    return _DatabaseClaim(key, now), None
+                except IntegrityError:
+                    # Another worker claimed the key first; read its row on the next pass
+                    db.rollback()
+                    return _PENDING
+
+            if row.fingerprint != fingerprint:
+                raise _mismatch_exception()
+            if row.response_body is not None:
+                return None, json.loads(row.response_body)
+            return _PENDING
+        finally:
+            # End the read transaction so the connection goes back to the pool between polls
+            db.rollback()
+            db.expunge_all()
+
+    async def complete(self, claim: _DatabaseClaim, body):
+        await asyncio.to_thread(self._complete, claim, body)
+
+    async def release(self, claim: _DatabaseClaim):
+        await asyncio.to_thread(self._release, claim)
+
+    # Both only touch the row of this claim, never one re-inserted by a worker that took the key over
+    def _complete(self, claim: _DatabaseClaim, body):
+        db = database.SessionLocal()
+        try:
+            db.query(database.IdempotencyKey).filter(
+                database.IdempotencyKey.key == claim.key,
+                database.IdempotencyKey.created_at == claim.created_at,
+            ).update({"response_body": json.dumps(body)}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _release(self, claim: _DatabaseClaim):
+        db = database.SessionLocal()
+        try:
+            db.query(database.IdempotencyKey).filter(
+                database.IdempotencyKey.key == claim.key,
+                database.IdempotencyKey.created_at == claim.created_at,
+                database.IdempotencyKey.response_body.is_(None),
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+def _create_store():
+    if settings.idempotency_store == "database":
+        return DatabaseIdempotencyStore(
+            settings.idempotency_ttl_seconds, settings.idempotency_wait_seconds, settings.idempotency_lease_seconds
+        )
+    if settings.idempotency_store != "memory":
+        logger.warning(f"Unknown idempotency_store {settings.idempotency_store!r}, using the in-memory store")
+    return MemoryIdempotencyStore(settings.idempotency_max_keys, settings.idempotency_ttl_seconds, settings.idempotency_wait_seconds)
+
+store = _create_store()
+
+
+async def run_idempotent(key: Optional[str], scope: str, payload, response: Response, handler: Callable):
+    """Run `handler` at most once per Idempotency-Key.
+
+    Retries with the same key and request body get the stored response back
+    (marked with an `Idempotent-Replayed` header) without running the handler.
+    Failed requests are not stored, so they can be retried with the same key.
+    Only a keyed digest of the request body is kept, never the body itself.
+    """
+    if key is None:
+        return handler()
+
+    key = f"{scope}:{key}"
+    # Keyed digest, so a stored fingerprint of a sign-up body cannot be brute-forced for the password
+    fingerprint = hmac.new(
+        settings.secret_key.encode("utf-8"),
+        json.dumps(jsonable_encoder(payload), sort_keys=True).encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+
+    claim, stored = await store.begin(key, fingerprint)
+    if claim is None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return stored
+
+    try:
+        result = handler()
+    except BaseException:
+        await store.release(claim)
+        raise
+
+    body = jsonable_encoder(result)
+    try:
+        await store.complete(claim, body)
+    except Exception as error:
+        # The request itself succeeded; a stale in-flight claim is taken over after idempotency_lease_seconds
+        logger.error(f"Error storing idempotent response for key {key}: {error}")
+    return body
@@ -5,19 +5,56 @@ from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 from typing import Optional
 from random import randrange
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 import time
 from .roturs import post, user, auth
 from .config import settings
-
-app = FastAPI(version="1.0.0.0", title="Posts API with ORM", description="A simple Posts API using SQLAlchemy ORM")
-app.middleware("CORS")(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+from . import database, stats, compression
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def reconcile_post_stats():
+    """Run one post statistics reconciliation in its own session."""
+    db = database.SessionLocal()
+    try:
+        if stats.reconcile_post_stats(db):
+            logger.info("Post statistics reconciled")
+        db.commit()
+    except Exception as error:
+        db.rollback()
+        logger.error(f"Error reconciling post statistics: {error}")
+    finally:
+        db.close()
+
+async def post_stats_reconcile_job(interval: int):
+    """Periodically correct any drift between the post statistics and the posts table."""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(reconcile_post_stats)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(database.create_tables)
+    # Seed and correct the statistics once at startup, even if the periodic job is disabled
+    await asyncio.to_thread(reconcile_post_stats)
+    task = None
+    if settings.post_stats_reconcile_seconds > 0:
+        task = asyncio.create_task(post_stats_reconcile_job(settings.post_stats_reconcile_seconds))
+    yield
+    if task is not None:
+        task.cancel()
+
+
+app = FastAPI(version="1.0.0.0", title="Posts API with ORM", description="A simple Posts API using SQLAlchemy ORM", lifespan=lifespan)
+app.middleware("CORS")(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(compression.CompressionMiddleware)
+
 my_posts = [{"title": "title of post 1", "content": "content of post 1", "id": 1},
             {"title": "title of post 2", "content": "content of post 2", "id": 2}]
 
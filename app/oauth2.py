@@ -3,6 +3,9 @@ from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 import time
+import hashlib
+import hmac
+import secrets
 from . import schema, database
 from sqlalchemy.orm import Session
 from .config import settings
@@ -14,6 +17,10 @@ SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 #Exiration time for the token in seconds (e.g., 30 minutes)
 ACCESS_TOKEN_EXPIRE_SECONDS = settings.access_token_expire_seconds  # 30 minutes
+#Expiration time for refresh tokens in seconds (e.g., 30 days)
+REFRESH_TOKEN_EXPIRE_SECONDS = settings.refresh_token_expire_seconds
+#Window in seconds in which reusing a just-rotated refresh token is not treated as theft
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = settings.refresh_token_reuse_grace_seconds
 
 out2_schema = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -29,6 +36,73 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def hash_refresh_token(token: str) -> str:
+    """Return the keyed SHA-256 digest under which a refresh token is stored."""
+    return hmac.new(SECRET_KEY.encode("utf-8"), token.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def create_refresh_token(user_id: int, db: Session) -> str:
+    """Create an opaque refresh token for the user and store its hash.
+
+    Expired tokens of the user are deleted at the same time, so the table
+    only holds tokens that can still be used or detected as reused.
+    The caller is responsible for committing the session.
+    """
+    now = datetime.utcnow()
+    db.query(database.RefreshToken).filter(
+        database.RefreshToken.user_id == user_id,
+        database.RefreshToken.expires_at < now,
+    ).delete(synchronize_session=False)
+
+    token = secrets.token_urlsafe(32)
+    db.add(database.RefreshToken(
+        token_hash=hash_refresh_token(token),
+        user_id=user_id,
+        expires_at=now + timedelta(seconds=REFRESH_TOKEN_EXPIRE_SECONDS),
+    ))
+    return token
+
+def is_recent_rotation(rotated_at: datetime, now: datetime) -> bool:
+    """Return True if a token rotated at `rotated_at` is still inside the reuse grace window."""
+    return rotated_at is not None and now - rotated_at <= timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS)
+
+def revoke_refresh_tokens(user_id: int, db: Session):
+    """Revoke every active refresh token of the user. The caller commits."""
+    db.query(database.RefreshToken).filter(
+        database.RefreshToken.user_id == user_id,
+        database.RefreshToken.revoked == False,  # noqa: E712
+    ).update({"revoked": True}, synchronize_session=False)
+
+def rotate_refresh_token(token: str, db: Session, credentials_exception):
+    """Exchange a refresh token for a new access/refresh token pair.
+
+    The presented token is revoked (rotation). Presenting a token that was
+    already revoked is treated as reuse of a stolen token, so every refresh
+    token of that user is revoked as well. The exception is a token rotated
+    only moments ago (e.g. two tabs refreshing at once): that request is
+    rejected but the user's other tokens are left alone.
+    """
+    now = datetime.utcnow()
+    stored = db.query(database.RefreshToken).filter(
+        database.RefreshToken.token_hash == hash_refresh_token(token)
+    ).with_for_update().first()
+    if stored is None:
+        raise credentials_exception
+    if stored.revoked:
+        if not is_recent_rotation(stored.rotated_at, now):
+            revoke_refresh_tokens(stored.user_id, db)
+            db.commit()
+        raise credentials_exception
+    if stored.expires_at < now:
+        raise credentials_exception
+
+    stored.revoked = True
+    stored.rotated_at = now
+    new_refresh_token = create_refresh_token(stored.user_id, db)
+    db.commit()
+
+    access_token = create_access_token(data={"user_id": stored.user_id})
+    return schema.Token(access_token=access_token, token_type="bearer", refresh_token=new_refresh_token)
+
 def verify_access_token(token: str, credentials_exception):
     """Verify a JWT access token and return the decoded data if valid."""
     try:
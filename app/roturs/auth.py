@@ -27,4 +27,22 @@ async def login(user_credential: OAuth2PasswordRequestForm = Depends(), db: Sess
 
     #create token and return it to the user in a real application
     token = oauth2.create_access_token(data={"user_id": user.id})
-    return schema.Token(access_token=token, token_type="bearer")
+    refresh_token = oauth2.create_refresh_token(user.id, db)
+    db.commit()
+    return schema.Token(access_token=token, token_type="bearer", refresh_token=refresh_token)
+
+@router.post("/refresh", response_model=schema.Token)
+async def refresh(request: schema.RefreshRequest, db: Session = Depends(database.get_db)):
+    """Issue a new access token from a refresh token without re-checking the password."""
+    return oauth2.rotate_refresh_token(request.refresh_token, db, credentials_exception=HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    ))
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(db: Session = Depends(database.get_db), current_user: database.User = Depends(oauth2.get_current_user)):
+    """Revoke all refresh tokens of the current user."""
+    oauth2.revoke_refresh_tokens(current_user.id, db)
+    db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,4 +1,4 @@
-from fastapi import Response, status, HTTPException, Depends, APIRouter
+from fastapi import Response, status, HTTPException, Depends, APIRouter, Header
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
@@ -7,7 +7,7 @@ import logging
 import time
 from app.schema import *
 from app.database import get_db, Post, User
-from app import oauth2
+from app import oauth2, stats, idempotency
 import logging
 
 
@@ -51,6 +51,19 @@ async def get_latest_post(db: Session = Depends(get_db)):
             detail="Error fetching latest post from database"
         )
 
+@router.get("/stats", response_model=PostStats)
+async def get_post_stats(db: Session = Depends(get_db)):
+    """Get post counts, published ratio and average rating from the maintained statistics."""
+    try:
+        return stats.get_post_stats(db)
+    except Exception as error:
+        db.rollback()
+        logger.error(f"Error fetching post statistics from database: {error}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error fetching post statistics from database"
+        )
+
 @router.get("/{id}")
 async def get_post(id: int, db: Session = Depends(get_db)):
     """Get a specific post by ID from the database using ORM."""
@@ -73,20 +86,34 @@ async def get_post(id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=PostResponse)
-async def create_post(post: PostCreate, db: Session = Depends(get_db), current_user: User = Depends(oauth2.get_current_user)):
-    """Create a new post in the database using ORM."""
+async def create_post(post: PostCreate, response: Response, db: Session = Depends(get_db), current_user: User = Depends(oauth2.get_current_user),
+                      idempotency_key: Optional[str] = Header(None, max_length=200)):
+    """Create a new post in the database using ORM.
+
+    Retries that send the same `Idempotency-Key` header get the original response back.
+    """
     if not post:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Post data is required"
         )
 
-    try:
-        
-        print(current_user.email)  # Accessing email to ensure current_user is valid
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
+    return await idempotency.run_idempotent(
+        idempotency_key, f"posts:{current_user.id}", post, response, lambda: _create_post(post, db)
+    )
+
+def _create_post(post: PostCreate, db: Session):
+    try:
         new_post = Post(**post.dict())
         db.add(new_post)
+        stats.apply_post_delta(db, new=post.dict())
         db.commit()
         db.refresh(new_post)
         return PostResponse.model_validate(new_post)
@@ -104,13 +131,15 @@ async def create_post(post: PostCreate, db: Session = Depends(get_db), current_u
 async def delete_post(id: int, db: Session = Depends(get_db), user_id: int = Depends(oauth2.get_current_user)):
     """Delete a post from the database using ORM."""
     try:
-        post = db.query(Post).filter(Post.id == id).first()
+        # Lock the row so the statistics delta comes from the post that is actually deleted
+        post = db.query(Post).filter(Post.id == id).with_for_update().first()
         if post is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"post with id: {id} does not exist"
             )
         db.delete(post)
+        stats.apply_post_delta(db, old={"published": post.published, "rating": post.rating})
         db.commit()
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     except HTTPException:
@@ -127,14 +156,17 @@ async def delete_post(id: int, db: Session = Depends(get_db), user_id: int = Dep
 async def update_post(id: int, post: PostCreate, db: Session = Depends(get_db), user_id: int = Depends(oauth2.get_current_user)):
     """Update an existing post in the database using ORM."""
     try:
-        existing_post = db.query(Post).filter(Post.id == id).first()
+        # Lock the row so the statistics delta comes from the values that are actually replaced
+        existing_post = db.query(Post).filter(Post.id == id).with_for_update().first()
         if existing_post is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"post with id: {id} does not exist"
             )
+        old_values = {"published": existing_post.published, "rating": existing_post.rating}
         for key, value in post.dict().items():
             setattr(existing_post, key, value)
+        stats.apply_post_delta(db, old=old_values, new=post.dict())
         db.commit()
         db.refresh(existing_post)
         return {"data": PostResponse.model_validate(existing_post)}
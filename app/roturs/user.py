@@ -1,4 +1,4 @@
-from fastapi import Response, status, HTTPException, Depends, APIRouter
+from fastapi import Response, status, HTTPException, Depends, APIRouter, Header
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
@@ -8,6 +8,7 @@ import time
 from app.schema import *
 from app.database import get_db, User as Userdb
 from ..utils import hash_password, verify_password
+from .. import idempotency
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -38,19 +39,29 @@ async def get_user(id: int, db: Session = Depends(get_db)):
         )
     
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=UserResponse)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    """Create a new user in the database using ORM."""
+async def create_user(user: UserCreate, response: Response, db: Session = Depends(get_db),
+                      idempotency_key: Optional[str] = Header(None, max_length=200)):
+    """Create a new user in the database using ORM.
+
+    Retries that send the same `Idempotency-Key` header get the original response back
+    without hashing the password again.
+    """
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User data is required"
         )
 
+    return await idempotency.run_idempotent(
+        idempotency_key, "users", user, response, lambda: _create_user(user, db)
+    )
+
+def _create_user(user: UserCreate, db: Session):
     try:
         hashed_password = hash_password(user.password)
         user.password = hashed_password
 
-        new_user = User(**user.model_dump())
+        new_user = Userdb(**user.model_dump())
         db.add(new_user)
         db.commit()
         db.refresh(new_user)
@@ -22,6 +22,14 @@ class PostResponse(BaseModel):
     # class Config:
     #     from_attributes = True
 
+class PostStats(BaseModel):
+    total_posts: int
+    published_posts: int
+    published_ratio: float
+    rated_posts: int
+    average_rating: Optional[float] = None
+    updated_at: Optional[datetime] = None
+
 class UserCreate(BaseModel):
     email: EmailStr
     password: str
@@ -49,6 +57,10 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str   
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     id: Optional[int] = None
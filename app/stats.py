@@ -0,0 +1,112 @@
+from sqlalchemy import func, case
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+import logging
+from .database import Post, PostStats
+
+logger = logging.getLogger(__name__)
+
+# The post statistics live in a single row with this id
+STATS_ROW_ID = 1
+
+
+def _post_delta(published, rating, sign: int) -> dict:
+    """Return the counter changes caused by adding (sign=1) or removing (sign=-1) a post."""
+    return {
+        "total_posts": sign,
+        "published_posts": sign if published else 0,
+        "rated_posts": sign if rating is not None else 0,
+        "rating_sum": sign * rating if rating is not None else 0,
+    }
+
+
+def post_stats_delta(old: dict = None, new: dict = None) -> dict:
+    """Return the counter changes for a post write.
+
+    `old` and `new` hold the `published` and `rating` values of the post
+    before and after the write (None for a create or a delete).
+    """
+    delta = {"total_posts": 0, "published_posts": 0, "rated_posts": 0, "rating_sum": 0}
+    for values, sign in ((old, -1), (new, 1)):
+        if values is not None:
+            for key, value in _post_delta(values.get("published"), values.get("rating"), sign).items():
+                delta[key] += value
+    return delta
+
+
+def ensure_stats_row(db: Session):
+    """Create the statistics row with zero counters if it does not exist yet.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING so concurrent callers cannot fail
+    on the primary key. The counters are corrected by the next reconciliation.
+    """
+    db.execute(insert(PostStats).values(
+        id=STATS_ROW_ID, total_posts=0, published_posts=0, rated_posts=0, rating_sum=0
+    ).on_conflict_do_nothing(index_elements=[PostStats.id]))
+
+
+def apply_post_delta(db: Session, old: dict = None, new: dict = None):
+    """Update the statistics row for a post write in the current transaction.
+
+    See `post_stats_delta` for `old` and `new`. The caller commits, so the
+    counters change atomically with the post itself.
+    """
+    delta = post_stats_delta(old, new)
+    changes = {getattr(PostStats, key): getattr(PostStats, key) + value for key, value in delta.items() if value}
+    if not changes:
+        return
+
+    updated = db.query(PostStats).filter(PostStats.id == STATS_ROW_ID).update(changes, synchronize_session=False)
+    if not updated:
+        ensure_stats_row(db)
+        db.query(PostStats).filter(PostStats.id == STATS_ROW_ID).update(changes, synchronize_session=False)
+
+
+def reconcile_post_stats(db: Session) -> bool:
+    """Recompute the statistics from the posts table and fix any drift.
+
+    The statistics row is locked before the posts are counted, so writers
+    that already updated it have committed and are included in the count,
+    and new writers wait until the correction is committed.
+    Returns True if the stored row had to be corrected. The caller commits.
+    """
+    ensure_stats_row(db)
+    stats = db.query(PostStats).filter(PostStats.id == STATS_ROW_ID).with_for_update().one()
+
+    total, published, rated, rating_sum = db.query(
+        func.count(Post.id),
+        func.coalesce(func.sum(case((Post.published == True, 1), else_=0)), 0),  # noqa: E712
+        func.count(Post.rating),
+        func.coalesce(func.sum(Post.rating), 0),
+    ).one()
+    actual = {
+        "total_posts": total,
+        "published_posts": published,
+        "rated_posts": rated,
+        "rating_sum": rating_sum,
+    }
+
+    drift = {key: value for key, value in actual.items() if getattr(stats, key) != value}
+    if drift:
+        logger.warning(f"Correcting post statistics drift: {drift}")
+        for key, value in drift.items():
+            setattr(stats, key, value)
+    return bool(drift)
+
+
+def get_post_stats(db: Session) -> dict:
+    """Read the statistics row and derive the ratio and average from it."""
+    stats = db.query(PostStats).filter(PostStats.id == STATS_ROW_ID).first()
+    if stats is None:
+        reconcile_post_stats(db)
+        db.commit()
+        stats = db.query(PostStats).filter(PostStats.id == STATS_ROW_ID).first()
+
+    return {
+        "total_posts": stats.total_posts,
+        "published_posts": stats.published_posts,
+        "published_ratio": stats.published_posts / stats.total_posts if stats.total_posts else 0.0,
+        "rated_posts": stats.rated_posts,
+        "average_rating": stats.rating_sum / stats.rated_posts if stats.rated_posts else None,
+        "updated_at": stats.updated_at,
+    }
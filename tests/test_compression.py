@@ -0,0 +1,141 @@
+import gzip
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from app import compression
+from app.compression import CompressedBodyCache, CompressionMiddleware
+
+
+def test_parse_accept_encoding():
+    assert compression.parse_accept_encoding("gzip, br;q=0.5, zstd;q=0, *;q=bad") == {
+        "gzip": 1.0, "br": 0.5, "zstd": 0.0, "*": 0.0,
+    }
+
+
+def test_parse_accept_encoding_empty():
+    assert compression.parse_accept_encoding("") == {}
+
+
+def test_choose_encoding_follows_server_preference():
+    assert compression.choose_encoding("gzip, br", ["zstd", "br", "gzip"]) == "br"
+
+
+def test_choose_encoding_skips_refused_encodings():
+    assert compression.choose_encoding("br;q=0, gzip", ["br", "gzip"]) == "gzip"
+
+
+def test_choose_encoding_wildcard():
+    assert compression.choose_encoding("*", ["br", "gzip"]) == "br"
+    assert compression.choose_encoding("*;q=0", ["br", "gzip"]) is None
+
+
+def test_choose_encoding_without_match():
+    assert compression.choose_encoding("identity", ["gzip"]) is None
+    assert compression.choose_encoding("", ["gzip"]) is None
+
+
+def test_is_compressible():
+    assert compression.is_compressible("application/json")
+    assert compression.is_compressible("text/plain; charset=utf-8")
+    assert not compression.is_compressible("text/event-stream")
+    assert not compression.is_compressible("image/png")
+    assert not compression.is_compressible("")
+
+
+def test_etag_matches_uses_weak_comparison():
+    assert compression.etag_matches('W/"abc"', 'W/"abc"')
+    assert compression.etag_matches('"abc"', 'W/"abc"')
+    assert compression.etag_matches('"x", W/"abc"', '"abc"')
+    assert compression.etag_matches("*", 'W/"abc"')
+    assert not compression.etag_matches('"abd"', 'W/"abc"')
+    assert not compression.etag_matches("", 'W/"abc"')
+
+
+def test_cache_evicts_by_total_size():
+    cache = CompressedBodyCache(max_bytes=10, max_entry_bytes=10)
+    cache.put("a", "gzip", b"12345")
+    cache.put("b", "gzip", b"12345")
+    cache.get("a", "gzip")  # "b" becomes the least recently used
+    cache.put("c", "gzip", b"123")
+    assert cache.get("b", "gzip") is None
+    assert cache.get("a", "gzip") == b"12345"
+    assert cache.get("c", "gzip") == b"123"
+    assert cache.size == 8
+
+
+def test_cache_skips_large_entries():
+    cache = CompressedBodyCache(max_bytes=100, max_entry_bytes=4)
+    cache.put("a", "gzip", b"12345")
+    assert cache.get("a", "gzip") is None
+    assert cache.size == 0
+
+
+def test_cache_replaces_existing_entry():
+    cache = CompressedBodyCache(max_bytes=100, max_entry_bytes=100)
+    cache.put("a", "gzip", b"12345")
+    cache.put("a", "gzip", b"12")
+    assert cache.size == 2
+
+
+PAYLOAD = {"data": [{"id": i, "title": f"title of post {i}"} for i in range(200)]}
+
+
+def make_client():
+    async def posts(request):
+        return JSONResponse(PAYLOAD)
+
+    async def small(request):
+        return JSONResponse({"data": "ok"})
+
+    async def events(request):
+        async def stream():
+            yield b"data: " + b"x" * 2048 + b"\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    app = Starlette(routes=[Route("/posts", posts), Route("/small", small), Route("/events", events)])
+    app.add_middleware(CompressionMiddleware)
+    return TestClient(app)
+
+
+def test_middleware_compresses_large_json():
+    response = make_client().get("/posts", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == PAYLOAD
+
+
+def test_middleware_leaves_small_responses_uncompressed():
+    response = make_client().get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"data": "ok"}
+
+
+def test_middleware_leaves_event_streams_alone():
+    response = make_client().get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "etag" not in response.headers
+
+
+def test_middleware_answers_if_none_match_with_304():
+    client = make_client()
+    etag = client.get("/posts").headers["etag"]
+    response = client.get("/posts", headers={"If-None-Match": etag.removeprefix("W/")})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_middleware_reuses_cached_compressed_body(monkeypatch):
+    calls = []
+
+    def counting_gzip(body):
+        calls.append(1)
+        return gzip.compress(body)
+
+    monkeypatch.setitem(compression.COMPRESSORS, "gzip", counting_gzip)
+    client = make_client()
+    first = client.get("/posts", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/posts", headers={"Accept-Encoding": "gzip"})
+    assert first.content == second.content
+    assert first.headers["etag"] == second.headers["etag"]
+    assert calls == [1]
@@ -0,0 +1,232 @@
+import asyncio
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app import database, idempotency
+from app.idempotency import DatabaseIdempotencyStore, MemoryIdempotencyStore
+
+
+def make_store(max_keys=10, ttl_seconds=60, wait_seconds=5):
+    return MemoryIdempotencyStore(max_keys, ttl_seconds, wait_seconds)
+
+
+def test_first_request_claims_key_and_replay_returns_body():
+    async def scenario():
+        store = make_store()
+        claim, body = await store.begin("k", "fp")
+        assert claim is not None and body is None
+        await store.complete(claim, {"id": 1})
+        return await store.begin("k", "fp")
+
+    assert asyncio.run(scenario()) == (None, {"id": 1})
+
+
+def test_different_body_with_same_key_is_rejected():
+    async def scenario():
+        store = make_store()
+        claim, _ = await store.begin("k", "fp")
+        await store.complete(claim, {"id": 1})
+        await store.begin("k", "other")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 422
+
+
+def test_released_key_can_be_claimed_again():
+    async def scenario():
+        store = make_store()
+        claim, _ = await store.begin("k", "fp")
+        await store.release(claim)
+        new_claim, _ = await store.begin("k", "fp")
+        return new_claim
+
+    assert asyncio.run(scenario()) is not None
+
+
+def test_release_of_replaced_claim_keeps_new_claim():
+    async def scenario():
+        store = make_store(ttl_seconds=-1)
+        old_claim, _ = await store.begin("k", "fp")
+        await store.complete(old_claim, {"id": 1})
+        new_claim, _ = await store.begin("k", "fp")  # the expired entry is replaced
+        await store.release(old_claim)
+        return store._entries.get("k") is new_claim
+
+    assert asyncio.run(scenario())
+
+
+def test_concurrent_duplicate_waits_for_original():
+    async def scenario():
+        store = make_store()
+        claim, _ = await store.begin("k", "fp")
+        duplicate = asyncio.create_task(store.begin("k", "fp"))
+        await asyncio.sleep(0)
+        assert not duplicate.done()
+        await store.complete(claim, {"id": 1})
+        return await duplicate
+
+    assert asyncio.run(scenario()) == (None, {"id": 1})
+
+
+def test_concurrent_duplicate_times_out_with_conflict():
+    async def scenario():
+        store = make_store(wait_seconds=0.01)
+        await store.begin("k", "fp")
+        await store.begin("k", "fp")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 409
+
+
+def test_expired_entry_is_claimed_again():
+    async def scenario():
+        store = make_store(ttl_seconds=-1)
+        claim, _ = await store.begin("k", "fp")
+        await store.complete(claim, {"id": 1})
+        return await store.begin("k", "fp")
+
+    claim, body = asyncio.run(scenario())
+    assert claim is not None and body is None
+
+
+def test_eviction_drops_least_recently_used_completed_entries():
+    async def scenario():
+        store = make_store(max_keys=2)
+        for key in ("a", "b"):
+            claim, _ = await store.begin(key, "fp")
+            await store.complete(claim, {"key": key})
+        await store.begin("a", "fp")  # touch "a" so "b" is the least recently used
+        await store.begin("c", "fp")
+        return list(store._entries)
+
+    assert asyncio.run(scenario()) == ["a", "c"]
+
+
+def test_eviction_keeps_in_flight_entries():
+    async def scenario():
+        store = make_store(max_keys=1)
+        await store.begin("a", "fp")
+        await store.begin("b", "fp")
+        return list(store._entries)
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+
+
+@pytest.fixture
+def db_store(monkeypatch):
+    """A DatabaseIdempotencyStore backed by an in-memory SQLite database."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    database.IdempotencyKey.__table__.create(engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine))
+    return DatabaseIdempotencyStore(ttl_seconds=60, wait_seconds=1, lease_seconds=60)
+
+
+def read_row(key):
+    db = database.SessionLocal()
+    try:
+        return db.query(database.IdempotencyKey).filter(database.IdempotencyKey.key == key).first()
+    finally:
+        db.close()
+
+
+def take_over(key):
+    """Simulate another worker replacing the claim row after the lease ran out."""
+    db = database.SessionLocal()
+    try:
+        row = db.query(database.IdempotencyKey).filter(database.IdempotencyKey.key == key).one()
+        row.created_at = row.created_at + timedelta(seconds=1)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_database_store_claim_and_replay(db_store):
+    async def scenario():
+        claim, body = await db_store.begin("k", "fp")
+        assert claim is not None and body is None
+        await db_store.complete(claim, {"id": 1})
+        return await db_store.begin("k", "fp")
+
+    assert asyncio.run(scenario()) == (None, {"id": 1})
+
+
+def test_database_store_complete_ignores_taken_over_claim(db_store):
+    async def scenario():
+        claim, _ = await db_store.begin("k", "fp")
+        take_over("k")
+        await db_store.complete(claim, {"id": 1})
+
+    asyncio.run(scenario())
+    assert read_row("k").response_body is None
+
+
+def test_database_store_release_ignores_taken_over_claim(db_store):
+    async def scenario():
+        claim, _ = await db_store.begin("k", "fp")
+        take_over("k")
+        await db_store.release(claim)
+
+    asyncio.run(scenario())
+    assert read_row("k") is not None
+
+
+def test_database_store_release_deletes_own_claim(db_store):
+    async def scenario():
+        claim, _ = await db_store.begin("k", "fp")
+        await db_store.release(claim)
+
+    asyncio.run(scenario())
+    assert read_row("k") is None
+
+
+def test_run_idempotent_runs_handler_once(monkeypatch):
+    monkeypatch.setattr(idempotency, "store", make_store())
+    calls = []
+
+    def handler():
+        calls.append(1)
+        return {"id": len(calls)}
+
+    async def scenario():
+        first = await idempotency.run_idempotent("key", "posts:1", {"title": "t"}, Response(), handler)
+        replay_response = Response()
+        second = await idempotency.run_idempotent("key", "posts:1", {"title": "t"}, replay_response, handler)
+        return first, second, replay_response
+
+    first, second, replay_response = asyncio.run(scenario())
+    assert first == second == {"id": 1}
+    assert calls == [1]
+    assert replay_response.headers["Idempotent-Replayed"] == "true"
+
+
+def test_run_idempotent_without_key_always_runs_handler(monkeypatch):
+    monkeypatch.setattr(idempotency, "store", make_store())
+    calls = []
+
+    async def scenario():
+        for _ in range(2):
+            await idempotency.run_idempotent(None, "users", {}, Response(), lambda: calls.append(1))
+
+    asyncio.run(scenario())
+    assert calls == [1, 1]
+
+
+def test_run_idempotent_failed_request_can_be_retried(monkeypatch):
+    monkeypatch.setattr(idempotency, "store", make_store())
+
+    def failing_handler():
+        raise HTTPException(status_code=500, detail="boom")
+
+    async def scenario():
+        with pytest.raises(HTTPException):
+            await idempotency.run_idempotent("key", "users", {}, Response(), failing_handler)
+        return await idempotency.run_idempotent("key", "users", {}, Response(), lambda: {"id": 2})
+
+    assert asyncio.run(scenario()) == {"id": 2}
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import database, oauth2
+
+
+def test_hash_refresh_token_is_deterministic_and_keyed():
+    token = "some-refresh-token"
+    digest = oauth2.hash_refresh_token(token)
+    assert digest == oauth2.hash_refresh_token(token)
+    assert digest != oauth2.hash_refresh_token("other-refresh-token")
+    assert token not in digest
+    assert len(digest) == 64
+
+
+def test_is_recent_rotation():
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    grace = timedelta(seconds=oauth2.REFRESH_TOKEN_REUSE_GRACE_SECONDS)
+    assert oauth2.is_recent_rotation(now, now)
+    assert oauth2.is_recent_rotation(now - grace, now)
+    assert not oauth2.is_recent_rotation(now - grace - timedelta(seconds=1), now)
+
+
+def test_is_recent_rotation_without_rotation():
+    # Tokens revoked by logout have no rotated_at and are always treated as reuse
+    assert not oauth2.is_recent_rotation(None, datetime(2026, 1, 1))
+
+
+def test_create_access_token_round_trip():
+    token = oauth2.create_access_token(data={"user_id": 7})
+    token_data = oauth2.verify_access_token(token, credentials_exception=ValueError("invalid"))
+    assert token_data.id == 7
+
+
+class InvalidToken(Exception):
+    pass
+
+
+@pytest.fixture
+def db():
+    """A throwaway session on an in-memory SQLite database with the user and refresh token tables."""
+    engine = create_engine("sqlite://")
+    database.Base.metadata.create_all(engine, tables=[database.User.__table__, database.RefreshToken.__table__])
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        database.User(id=1, email="user@example.com", password="hashed"),
+        database.User(id=2, email="other@example.com", password="hashed"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def stored_token(db, token):
+    return db.query(database.RefreshToken).filter(
+        database.RefreshToken.token_hash == oauth2.hash_refresh_token(token)
+    ).one()
+
+
+def active_tokens(db, user_id):
+    return db.query(database.RefreshToken).filter(
+        database.RefreshToken.user_id == user_id,
+        database.RefreshToken.revoked == False,  # noqa: E712
+    ).count()
+
+
+def issue(db, user_id=1):
+    token = oauth2.create_refresh_token(user_id, db)
+    db.commit()
+    return token
+
+
+def test_rotation_revokes_old_token_and_issues_new_pair(db):
+    token = issue(db)
+    result = oauth2.rotate_refresh_token(token, db, credentials_exception=InvalidToken())
+
+    assert result.token_type == "bearer"
+    assert oauth2.verify_access_token(result.access_token, InvalidToken()).id == 1
+    assert result.refresh_token != token
+    old = stored_token(db, token)
+    assert old.revoked and old.rotated_at is not None
+    assert not stored_token(db, result.refresh_token).revoked
+
+
+def test_unknown_token_is_rejected(db):
+    with pytest.raises(InvalidToken):
+        oauth2.rotate_refresh_token("not-a-token", db, credentials_exception=InvalidToken())
+
+
+def test_expired_token_is_rejected(db):
+    token = issue(db)
+    stored_token(db, token).expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+    with pytest.raises(InvalidToken):
+        oauth2.rotate_refresh_token(token, db, credentials_exception=InvalidToken())
+
+
+def test_reuse_after_grace_window_revokes_all_user_tokens(db):
+    token = issue(db)
+    other_session_token = issue(db)
+    other_user_token = issue(db, user_id=2)
+    oauth2.rotate_refresh_token(token, db, credentials_exception=InvalidToken())
+    stored_token(db, token).rotated_at = datetime.utcnow() - timedelta(
+        seconds=oauth2.REFRESH_TOKEN_REUSE_GRACE_SECONDS + 1
+    )
+    db.commit()
+
+    with pytest.raises(InvalidToken):
+        oauth2.rotate_refresh_token(token, db, credentials_exception=InvalidToken())
+
+    assert active_tokens(db, 1) == 0
+    assert stored_token(db, other_session_token).revoked
+    assert not stored_token(db, other_user_token).revoked
+
+
+def test_reuse_within_grace_window_keeps_other_tokens(db):
+    token = issue(db)
+    other_session_token = issue(db)
+    result = oauth2.rotate_refresh_token(token, db, credentials_exception=InvalidToken())
+
+    with pytest.raises(InvalidToken):
+        oauth2.rotate_refresh_token(token, db, credentials_exception=InvalidToken())
+
+    assert not stored_token(db, other_session_token).revoked
+    assert not stored_token(db, result.refresh_token).revoked
+
+
+def test_create_refresh_token_prunes_expired_tokens_of_the_user(db):
+    expired = issue(db)
+    other_user_expired = issue(db, user_id=2)
+    for token in (expired, other_user_expired):
+        stored_token(db, token).expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+    fresh = issue(db)
+
+    hashes = {row.token_hash for row in db.query(database.RefreshToken).all()}
+    assert oauth2.hash_refresh_token(expired) not in hashes
+    assert oauth2.hash_refresh_token(other_user_expired) in hashes
+    assert oauth2.hash_refresh_token(fresh) in hashes
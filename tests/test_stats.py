@@ -0,0 +1,45 @@
+from app import stats
+
+
+def test_delta_for_create():
+    assert stats.post_stats_delta(new={"published": True, "rating": 4}) == {
+        "total_posts": 1, "published_posts": 1, "rated_posts": 1, "rating_sum": 4,
+    }
+
+
+def test_delta_for_create_unpublished_unrated():
+    assert stats.post_stats_delta(new={"published": False, "rating": None}) == {
+        "total_posts": 1, "published_posts": 0, "rated_posts": 0, "rating_sum": 0,
+    }
+
+
+def test_delta_for_delete():
+    assert stats.post_stats_delta(old={"published": True, "rating": 3}) == {
+        "total_posts": -1, "published_posts": -1, "rated_posts": -1, "rating_sum": -3,
+    }
+
+
+def test_delta_for_update_changing_rating_and_published():
+    delta = stats.post_stats_delta(
+        old={"published": True, "rating": 2},
+        new={"published": False, "rating": 5},
+    )
+    assert delta == {"total_posts": 0, "published_posts": -1, "rated_posts": 0, "rating_sum": 3}
+
+
+def test_delta_for_update_removing_rating():
+    delta = stats.post_stats_delta(
+        old={"published": False, "rating": 5},
+        new={"published": False, "rating": None},
+    )
+    assert delta == {"total_posts": 0, "published_posts": 0, "rated_posts": -1, "rating_sum": -5}
+
+
+def test_delta_for_zero_rating_counts_as_rated():
+    assert stats.post_stats_delta(new={"published": True, "rating": 0})["rated_posts"] == 1
+
+
+def test_apply_post_delta_skips_database_when_nothing_changes():
+    # An update that keeps published and rating must not touch the statistics row
+    values = {"published": True, "rating": 4}
+    stats.apply_post_delta(None, old=values, new=dict(values))